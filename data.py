@@ -1,13 +1,53 @@
+import os
+import sqlite3
+from contextlib import closing
+import pandas as pd
+import pyarrow as pa
 import sqlalchemy
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.elements import TextClause
 from datetime import datetime
 
-QUERY_FLIGHT_BY_ID = "SELECT flights.*, airlines.airline, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY FROM flights JOIN airlines ON flights.airline = airlines.id WHERE flights.ID = :id"
-QUERY_FLIGHT_BY_DATE = "SELECT flights.*, airlines.airline, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY FROM flights JOIN airlines ON flights.airline = airlines.id WHERE flights.day = :day AND flights.month = :month AND flights.year = :year"
-QUERY_DELAYED_FLIGHT_BY_AIRLINE = "SELECT flights.*, airlines.airline, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY, flights.AIRLINE_DELAY FROM flights JOIN airlines ON flights.airline = airlines.id WHERE DELAY IS NOT NULL AND (flights.AIRLINE_DELAY IS NOT NULL OR flights.WEATHER_DELAY IS NOT NULL OR flights.LATE_AIRCRAFT_DELAY IS NOT NULL OR flights.SECURITY_DELAY IS NOT NULL OR flights.AIR_SYSTEM_DELAY IS NOT NULL OR flights.ARRIVAL_DELAY IS NOT NULL) AND LOWER(airlines.AIRLINE) LIKE LOWER(:airline)"
-QUERY_DELAYED_FLIGHT_BY_AIRPORT = "SELECT flights.*, airports.airport, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY, flights.AIRLINE_DELAY FROM flights JOIN airports ON flights.ORIGIN_AIRPORT = airports.IATA_CODE WHERE (DELAY IS NOT NULL OR flights.AIRLINE_DELAY IS NOT NULL OR flights.WEATHER_DELAY IS NOT NULL OR flights.LATE_AIRCRAFT_DELAY IS NOT NULL OR flights.SECURITY_DELAY IS NOT NULL OR flights.AIR_SYSTEM_DELAY IS NOT NULL OR flights.ARRIVAL_DELAY IS NOT NULL) AND LOWER(airports.IATA_CODE) LIKE LOWER(:airport)"
-QUERY_PERCENTAGE_DELAYED_BY_AIRLINE = "SELECT airlines.AIRLINE, COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END) AS delayed_flights, COUNT(*) AS total_flights FROM airlines JOIN flights ON airlines.ID = flights.AIRLINE GROUP BY airlines.AIRLINE"
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
 
+QUERY_FLIGHT_BY_ID = text("SELECT flights.*, airlines.airline, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY FROM flights JOIN airlines ON flights.airline = airlines.id WHERE flights.ID = :id")
+QUERY_FLIGHT_BY_DATE = text("SELECT flights.*, airlines.airline, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY FROM flights JOIN airlines ON flights.airline = airlines.id WHERE flights.day = :day AND flights.month = :month AND flights.year = :year")
+QUERY_DELAYED_FLIGHT_BY_AIRLINE = text("SELECT flights.*, airlines.airline, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY, flights.AIRLINE_DELAY FROM flights JOIN airlines ON flights.airline = airlines.id WHERE DELAY IS NOT NULL AND (flights.AIRLINE_DELAY IS NOT NULL OR flights.WEATHER_DELAY IS NOT NULL OR flights.LATE_AIRCRAFT_DELAY IS NOT NULL OR flights.SECURITY_DELAY IS NOT NULL OR flights.AIR_SYSTEM_DELAY IS NOT NULL OR flights.ARRIVAL_DELAY IS NOT NULL) AND LOWER(airlines.AIRLINE) LIKE LOWER(:airline) AND flights.DEPARTURE_DELAY > 0")
+QUERY_DELAYED_FLIGHT_BY_AIRPORT = text("SELECT flights.*, airports.airport, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY, flights.AIRLINE_DELAY FROM flights JOIN airports ON flights.ORIGIN_AIRPORT = airports.IATA_CODE WHERE (DELAY IS NOT NULL OR flights.AIRLINE_DELAY IS NOT NULL OR flights.WEATHER_DELAY IS NOT NULL OR flights.LATE_AIRCRAFT_DELAY IS NOT NULL OR flights.SECURITY_DELAY IS NOT NULL OR flights.AIR_SYSTEM_DELAY IS NOT NULL OR flights.ARRIVAL_DELAY IS NOT NULL) AND LOWER(airports.IATA_CODE) LIKE LOWER(:airport) AND flights.DEPARTURE_DELAY > 0")
+QUERY_PERCENTAGE_DELAYED_BY_AIRLINE = text("SELECT airlines.AIRLINE, COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END) AS delayed_flights, COUNT(*) AS total_flights, COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END) * 100.0 / COUNT(*) AS delay_percentage FROM airlines JOIN flights ON airlines.ID = flights.AIRLINE GROUP BY airlines.AIRLINE ORDER BY delay_percentage DESC")
+
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=30000000000",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA query_only=ON",
+]
+
+INDEX_STATEMENTS = {
+    'idx_flights_ymd': "CREATE INDEX IF NOT EXISTS idx_flights_ymd ON flights(year, month, day)",
+    'idx_flights_origin': "CREATE INDEX IF NOT EXISTS idx_flights_origin ON flights(ORIGIN_AIRPORT)",
+    'idx_flights_airline': "CREATE INDEX IF NOT EXISTS idx_flights_airline ON flights(AIRLINE)",
+    'idx_flights_dest': "CREATE INDEX IF NOT EXISTS idx_flights_dest ON flights(DESTINATION_AIRPORT)",
+    'idx_airports_iata': "CREATE INDEX IF NOT EXISTS idx_airports_iata ON airports(IATA_CODE)",
+}
+
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune every new SQLite connection for large read scans
+    (memory mapped file, bigger page cache, read only).
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
 
 
 class FlightData:
@@ -20,9 +60,109 @@ class FlightData:
 
     def __init__(self, db_uri):
         """
-        Initialize a new engine using the given database URI
+        Initialize a new engine using the given database URI,
+        and open the connection that is reused by all queries.
         """
-        self._engine = create_engine(db_uri)
+        self._engine = create_engine(db_uri, pool_pre_ping=False,
+                                     connect_args={'check_same_thread': False})
+        event.listen(self._engine, "connect", _set_sqlite_pragmas)
+        self._ensure_indexes()
+        db_path = self._engine.url.database
+        self._analytics_engine = self._connect_analytics(db_path)
+        if self._analytics_engine is None:
+            self._load_into_memory(db_path)
+        self._conn = self._engine.connect()
+        self._stmt_cache = {}
+        self._result_cache = {}
+
+    def _load_into_memory(self, db_path):
+        """
+        Copy the database file into an in-memory SQLite database (with the backup API),
+        and point the engine at the copy, so the queries of the session don't hit the disk.
+        The file database is kept if it doesn't fit into the available RAM.
+        Only used without the DuckDB analytics engine: DuckDB attaches the file itself
+        and can't read the in-memory copy, so the copy would only double the memory.
+        """
+        if not db_path or db_path == ':memory:' or not os.path.isfile(db_path):
+            return
+        try:
+            available = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+        except (AttributeError, ValueError, OSError):
+            # SC_AVPHYS_PAGES is Linux only (missing on macOS, no sysconf on Windows),
+            # there the file database is used as is
+            return
+        if os.path.getsize(db_path) >= available:
+            return
+        try:
+            memory = sqlite3.connect(':memory:', check_same_thread=False)
+            with closing(sqlite3.connect(db_path)) as disk:
+                disk.backup(memory)
+        except sqlite3.Error as e:
+            print(f"Error loading database into memory: {e}")
+            return
+        self._engine.dispose()
+        self._engine = create_engine('sqlite://', creator=lambda: memory, poolclass=StaticPool)
+        event.listen(self._engine, "connect", _set_sqlite_pragmas)
+
+    def _connect_analytics(self, db_path):
+        """
+        Attach the SQLite database file to an in-process DuckDB connection,
+        which runs the bulk aggregation queries on all cores.
+        Returns None if duckdb is not installed or the database can't be attached.
+        """
+        if duckdb is None or not db_path or db_path == ':memory:':
+            return None
+        try:
+            analytics = duckdb.connect()
+            try:
+                analytics.execute("LOAD sqlite")
+            except duckdb.Error:
+                # Only download the extension if it isn't installed yet
+                analytics.execute("INSTALL sqlite")
+                analytics.execute("LOAD sqlite")
+            quoted_path = db_path.replace("'", "''")
+            analytics.execute(f"ATTACH '{quoted_path}' AS s (TYPE sqlite, READ_ONLY)")
+            analytics.execute("USE s")
+            return analytics
+        except Exception as e:
+            print(f"Error attaching analytics engine, using SQLite only: {e}")
+            return None
+
+    def _ensure_indexes(self):
+        """
+        Create the indexes used by the WHERE/JOIN columns of the queries (if missing),
+        and run ANALYZE so the SQLite query planner picks them up.
+        Nothing is written if the indexes and the planner statistics already exist.
+        """
+        try:
+            with self._engine.begin() as connection:
+                existing = set(connection.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type IN ('index', 'table')")).scalars())
+                missing = [name for name in INDEX_STATEMENTS if name not in existing]
+                if not missing and 'sqlite_stat1' in existing:
+                    return
+                # Connections are opened with query_only=ON, lift it while creating the indexes
+                connection.execute(text("PRAGMA query_only=OFF"))
+                try:
+                    for name in missing:
+                        connection.execute(text(INDEX_STATEMENTS[name]))
+                    connection.execute(text("ANALYZE"))
+                finally:
+                    connection.execute(text("PRAGMA query_only=ON"))
+        except Exception as e:
+            print(f"Error creating indexes: {e}")
+
+    def _prepare(self, query):
+        """
+        Returns the text() statement for the given SQL query,
+        wrapping each query string only once (text() statements are returned as is).
+        """
+        if isinstance(query, TextClause):
+            return query
+        query_exe = self._stmt_cache.get(query)
+        if query_exe is None:
+            query_exe = self._stmt_cache[query] = sqlalchemy.text(query)
+        return query_exe
 
     def _execute_query(self, query, params):
         """
@@ -31,18 +171,61 @@ class FlightData:
         If an exception was raised, print the error, and return an empty list.
         """
         try:
-            with self._engine.connect() as connection:
-                query_exe = sqlalchemy.text(query)
-                result = connection.execute(query_exe, params)
-                rows = result.fetchall()
-                row_content = []
-                for row in rows:
-                    row_content.append(row)
-                return row_content
+            query_exe = self._prepare(query)
+            return self._conn.execute(query_exe, params).mappings().all()
         except Exception as e:
             print(f"Error executing query: {e}")
+            self._conn.rollback()
             return []
 
+    def _read_sql_df(self, query, params):
+        """
+        Execute an SQL query with the params provided in a dictionary,
+        and returns the result as a pandas DataFrame with Arrow backed columns.
+        Results of parameterless (aggregation) queries are cached for the lifetime
+        of the object, each call gets its own copy.
+        If an exception was raised, print the error, and return an empty DataFrame.
+        """
+        key = ('df', query)
+        if not params and key in self._result_cache:
+            return self._result_cache[key].copy()
+        try:
+            df = pd.read_sql_query(self._prepare(query), self._conn, params=params,
+                                   dtype_backend='pyarrow')
+            if not params:
+                self._result_cache[key] = df
+                return df.copy()
+            return df
+        except Exception as e:
+            print(f"Error executing query: {e}")
+            self._conn.rollback()
+            return pd.DataFrame()
+
+    def _read_analytics_table(self, query):
+        """
+        Execute a parameterless aggregation query with DuckDB,
+        and returns the result as a pyarrow Table (no pandas round trip).
+        Falls back to SQLite if the analytics engine is not available or the query fails
+        (e.g. DuckDB's sqlite scanner rejects values that don't match the column type).
+        """
+        if self._analytics_engine is None:
+            return pa.Table.from_pandas(self._read_sql_df(query, {}), preserve_index=False)
+        key = ('arrow', query)
+        if key in self._result_cache:
+            return self._result_cache[key]
+        try:
+            result = self._analytics_engine.execute(self._prepare(query).text)
+            # Newer DuckDB versions return a RecordBatchReader from .arrow()
+            if hasattr(result, 'to_arrow_table'):
+                tbl = result.to_arrow_table()
+            else:
+                tbl = result.fetch_arrow_table()
+        except duckdb.Error:
+            # Cache the SQLite result under the DuckDB key, so the failing scan runs only once
+            tbl = pa.Table.from_pandas(self._read_sql_df(query, {}), preserve_index=False)
+        self._result_cache[key] = tbl
+        return tbl
+
     def get_flight_by_id(self, flight_id):
         """
         Searches for flight details using flight ID.
@@ -93,4 +276,8 @@ class FlightData:
         """
         Closes the connection to the databse when the object is about to be destroyed
         """
+        if getattr(self, '_conn', None) is not None:
+            self._conn.close()
+        if getattr(self, '_analytics_engine', None) is not None:
+            self._analytics_engine.close()
         self._engine.dispose()
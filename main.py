@@ -1,6 +1,8 @@
+import sys
 import data
 from datetime import datetime
 import sqlalchemy
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -9,22 +11,41 @@ import folium
 SQLITE_URI = 'sqlite:///data/flights.sqlite3'
 IATA_LENGTH = 3
 
-QUERY_PERCENTAGE_DELAYED_BY_AIRLINE = ("SELECT airlines.AIRLINE, "
-                                       "COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END) AS delayed_flights, "
-                                       "COUNT(*) AS total_flights "
-                                       "FROM airlines "
-                                       "JOIN flights ON airlines.ID = flights.AIRLINE "
-                                       "GROUP BY airlines.AIRLINE")
-
-QUERY_PERCENTAGE_DELAYED_BY_HOUR = ("SELECT DEPARTURE_TIME, DEPARTURE_DELAY "
-                                    "FROM flights "
-                                    "WHERE DEPARTURE_TIME IS NOT NULL AND DEPARTURE_DELAY IS NOT NULL")
-
-QUERY_HEATMAP_DELAY = ("SELECT ORIGIN_AIRPORT, DESTINATION_AIRPORT, "
-                       "COUNT(*) AS total_flights, "
-                       "COUNT(CASE WHEN DEPARTURE_DELAY > 0 THEN 1 END) AS  delayed_flights "
-                       "FROM flights WHERE ORIGIN_AIRPORT IS NOT NULL AND DESTINATION_AIRPORT IS NOT NULL "
-                       "GROUP BY ORIGIN_AIRPORT, DESTINATION_AIRPORT")
+QUERY_PERCENTAGE_DELAYED_BY_AIRLINE = sqlalchemy.text("SELECT airlines.AIRLINE, "
+                                                      "COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END) AS delayed_flights, "
+                                                      "COUNT(*) AS total_flights, "
+                                                      "COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END) * 100.0 / COUNT(*) AS delay_percentage "
+                                                      "FROM airlines "
+                                                      "JOIN flights ON airlines.ID = flights.AIRLINE "
+                                                      "GROUP BY airlines.AIRLINE "
+                                                      "ORDER BY delay_percentage DESC")
+
+QUERY_PERCENTAGE_DELAYED_BY_HOUR = sqlalchemy.text("SELECT CAST((DEPARTURE_TIME - DEPARTURE_TIME % 100) / 100 AS INTEGER) AS HOUR, "
+                                                   "SUM(CASE WHEN DEPARTURE_DELAY > 0 THEN 1 ELSE 0 END) AS delayed, "
+                                                   "COUNT(*) AS total, "
+                                                   "SUM(CASE WHEN DEPARTURE_DELAY > 0 THEN 1 ELSE 0 END) * 100.0 / COUNT(*) AS PERCENT_DELAYED "
+                                                   "FROM flights "
+                                                   "WHERE DEPARTURE_TIME IS NOT NULL AND DEPARTURE_DELAY IS NOT NULL "
+                                                   "AND DEPARTURE_TIME < 2400 "
+                                                   "GROUP BY HOUR")
+
+QUERY_HEATMAP_DELAY = sqlalchemy.text("SELECT ORIGIN_AIRPORT, DESTINATION_AIRPORT, "
+                                      "COUNT(*) AS total_flights, "
+                                      "COUNT(CASE WHEN DEPARTURE_DELAY > 0 THEN 1 END) AS  delayed_flights "
+                                      "FROM flights WHERE ORIGIN_AIRPORT IS NOT NULL AND DESTINATION_AIRPORT IS NOT NULL "
+                                      "GROUP BY ORIGIN_AIRPORT, DESTINATION_AIRPORT "
+                                      "ORDER BY ORIGIN_AIRPORT, DESTINATION_AIRPORT")
+
+QUERY_PERCENTAGE_ON_ROUTE_MAP = sqlalchemy.text("SELECT f.ORIGIN_AIRPORT, f.DESTINATION_AIRPORT, "
+                                                "COUNT(*) AS total_flights, "
+                                                "COUNT(CASE WHEN f.DEPARTURE_DELAY > 0 THEN 1 END) AS delayed_flights, "
+                                                "a1.LATITUDE AS origin_lat, a1.LONGITUDE AS origin_lon, "
+                                                "a2.LATITUDE AS dest_lat, a2.LONGITUDE AS dest_lon "
+                                                "FROM flights f "
+                                                "JOIN airports a1 ON f.ORIGIN_AIRPORT = a1.IATA_CODE "
+                                                "JOIN airports a2 ON f.DESTINATION_AIRPORT = a2.IATA_CODE "
+                                                "WHERE f.ORIGIN_AIRPORT = :origin AND f.DESTINATION_AIRPORT = :dest "
+                                                "GROUP BY f.ORIGIN_AIRPORT, f.DESTINATION_AIRPORT")
 
 
 def show_delay_lines_on_route_map(data_manager):
@@ -35,19 +56,8 @@ def show_delay_lines_on_route_map(data_manager):
     origin = input("Enter IATA Code for Origin Airport: ")
     destination = input("Enter IATA Code for Destination Airport: ")
 
-    QUERY_PERCENTAGE_ON_ROUTE_MAP = (f"SELECT f.ORIGIN_AIRPORT, f.DESTINATION_AIRPORT, "
-                                     f"COUNT(*) AS total_flights, "
-                                     f"COUNT(CASE WHEN f.DEPARTURE_DELAY > 0 THEN 1 END) AS delayed_flights, "
-                                     f"a1.LATITUDE AS origin_lat, a1.LONGITUDE AS origin_lon, "
-                                     f"a2.LATITUDE AS dest_lat, a2.LONGITUDE AS dest_lon "
-                                     f"FROM flights f "
-                                     f"JOIN airports a1 ON f.ORIGIN_AIRPORT = a1.IATA_CODE "
-                                     f"JOIN airports a2 ON f.DESTINATION_AIRPORT = a2.IATA_CODE "
-                                     f"WHERE f.ORIGIN_AIRPORT = '{origin}' AND f.DESTINATION_AIRPORT = '{destination}' "
-                                     f"GROUP BY f.ORIGIN_AIRPORT, f.DESTINATION_AIRPORT;")
-
-    results = data_manager._execute_query(QUERY_PERCENTAGE_ON_ROUTE_MAP, {})
-    df = pd.DataFrame(results)
+    params = {'origin': origin, 'dest': destination}
+    df = data_manager._read_sql_df(QUERY_PERCENTAGE_ON_ROUTE_MAP, params)
     if df.empty:
         print("No route data found.")
         return
@@ -61,26 +71,21 @@ def show_delay_lines_on_route_map(data_manager):
     df['dest_lat'] = pd.to_numeric(df['dest_lat'], errors='coerce')
     df['dest_lon'] = pd.to_numeric(df['dest_lon'], errors='coerce')
 
-    for _, row in df.iterrows():
-        if any(pd.isnull([row['origin_lat'], row['origin_lon'], row['dest_lat'], row['dest_lon']])):
-            continue
-        delay = row['delay_percent']
-        if delay < 10:
-            color = 'green'
-        elif delay < 30:
-            color = 'orange'
-        else:
-            color = 'red'
+    df = df.dropna(subset=['origin_lat', 'origin_lon', 'dest_lat', 'dest_lon'])
+    df = df.assign(color=pd.cut(df['delay_percent'], bins=[-np.inf, 10, 30, np.inf],
+                                labels=['green', 'orange', 'red'], right=False))
 
+    for row in df.itertuples(index=False):
+        delay = row.delay_percent
         folium.PolyLine(
             locations=[
-                (row['origin_lat'], row['origin_lon']),
-                (row['dest_lat'], row['dest_lon'])
+                (row.origin_lat, row.origin_lon),
+                (row.dest_lat, row.dest_lon)
                 ],
-            color=color,
+            color=row.color,
             weight=2 + delay / 10,
             opacity=0.6,
-            popup = f"{row['ORIGIN_AIRPORT']} -> {row['DESTINATION_AIRPORT']} ({delay:.1f}% delayed)"
+            popup = f"{row.ORIGIN_AIRPORT} -> {row.DESTINATION_AIRPORT} ({delay:.1f}% delayed)"
         ).add_to(us_map)
     us_map.save('delays_map.html')
     print("Flight paths map saved to flight_paths_delayed_map.html.")
@@ -91,16 +96,18 @@ def show_delay_heatmap(data_manager):
         Displays a heatmap of flight delays by route (origin to destination).
         Uses seaborn to visualize delay percentages.
         """
-    results = data_manager._execute_query(QUERY_HEATMAP_DELAY, {})
-    if not results:
+    df = data_manager._read_analytics_table(QUERY_HEATMAP_DELAY).to_pandas()
+    if df.empty:
         print("No data found.")
         return
 
-    df = pd.DataFrame(results)
-
+    # Only a few hundred distinct IATA codes, categories keep the columns small
+    df['ORIGIN_AIRPORT'] = df['ORIGIN_AIRPORT'].astype('category')
+    df['DESTINATION_AIRPORT'] = df['DESTINATION_AIRPORT'].astype('category')
     df['DELAY_PERCENT'] = (df['delayed_flights'] / df['total_flights']) * 100
 
-    pivot_table = df.pivot(index='ORIGIN_AIRPORT', columns='DESTINATION_AIRPORT', values='DELAY_PERCENT')
+    pivot_table = df.pivot_table(index='ORIGIN_AIRPORT', columns='DESTINATION_AIRPORT', values='DELAY_PERCENT',
+                                 aggfunc='first', observed=True).astype(float)
 
     plt.figure(figsize=(16, 12))
     sns.heatmap(pivot_table, cmap='YlOrRd', linewidths=0.5, linecolor='gray', square=False, cbar_kws={'label': 'Delay %'})
@@ -114,26 +121,16 @@ def show_delay_heatmap(data_manager):
 def show_delay_percent_by_hour(data_manager):
     """
         Displays a bar chart showing percentage of delayed flights by hour of departure.
-        Filters invalid hours and uses matplotlib for plotting.
+        Hours are bucketed and counted in SQL, invalid hours are filtered out there too.
+        The Arrow columns are handed to matplotlib without building a DataFrame.
         """
-    results = data_manager._execute_query(QUERY_PERCENTAGE_DELAYED_BY_HOUR, {})
-    if not results:
+    tbl = data_manager._read_analytics_table(QUERY_PERCENTAGE_DELAYED_BY_HOUR)
+    if tbl.num_rows == 0:
         print("No results found.")
         return
-    df = pd.DataFrame(results)
-
-    df['DEPARTURE_TIME'] = df['DEPARTURE_TIME'].astype(str).str.zfill(4)
-    df['HOUR'] = df['DEPARTURE_TIME'].str[:2].astype(int)
-
-    df = df[df['HOUR'] < 24]
-
-    df['DELAYED'] = df['DEPARTURE_DELAY'] > 0
-
-    grouped = df.groupby('HOUR')['DELAYED'].agg(['sum', 'count'])
-    grouped['PERCENT_DELAYED'] =(grouped['sum'] / grouped['count']) * 100
 
     plt.figure(figsize=(12, 6))
-    plt.bar(grouped.index, grouped['PERCENT_DELAYED'], color='skyblue')
+    plt.bar(tbl['HOUR'].to_numpy(), tbl['PERCENT_DELAYED'].to_numpy(), color='skyblue')
     plt.xlabel('Hour of day (0-23)')
     plt.ylabel('Percentage of Delayed Flights')
     plt.title('Percentage of Delayed Flights by Hour of Day')
@@ -147,22 +144,17 @@ def show_delay_percent_by_airline(data_manager):
     """
         Displays a bar chart showing the percentage of delayed flights for each airline.
         """
-    results = data_manager._execute_query(QUERY_PERCENTAGE_DELAYED_BY_AIRLINE, {})
-    if not results:
+    tbl = data_manager._read_analytics_table(QUERY_PERCENTAGE_DELAYED_BY_AIRLINE)
+    if tbl.num_rows == 0:
         print("No results found.")
         return
-    df = pd.DataFrame(results)
 
-    if 'delayed_flights' not in df.columns or 'total_flights' not in df.columns:
+    if 'AIRLINE' not in tbl.column_names or 'delay_percentage' not in tbl.column_names:
         print("Invalid data format.")
         return
 
-    df['delay_percentage'] = (df['delayed_flights'] / df['total_flights']) * 100
-
-    # df.sort_values(by='delay_percentage', ascending=False, inplace=True)
-
     plt.figure(figsize=(12, 6))
-    plt.bar(df['AIRLINE'], df['delay_percentage'], color='orange')
+    plt.bar(tbl['AIRLINE'].to_numpy(), tbl['delay_percentage'].to_numpy(), color='orange')
     plt.ylabel('Delay Percentage in %')
     plt.xlabel('Airline')
     plt.title('Percentage of Delayed Flights per Airline')
@@ -179,7 +171,7 @@ def delayed_flights_by_airline(data_manager):
     """
     airline_input = input("Enter airline name: ")
     results = data_manager.get_delayed_flights_by_airline(airline_input)
-    print_results(results, filter_delay_only=True)
+    print_results(results)
 
 
 def delayed_flights_by_airport(data_manager):
@@ -195,7 +187,7 @@ def delayed_flights_by_airport(data_manager):
         if airport_input.isalpha() and len(airport_input) == IATA_LENGTH:
             valid = True
     results = data_manager.get_delayed_flights_by_airport(airport_input)
-    print_results(results, filter_delay_only=True)
+    print_results(results)
 
 
 def flight_by_id(data_manager):
@@ -235,7 +227,7 @@ def flights_by_date(data_manager):
     print_results(results)
 
 
-def print_results(results, filter_delay_only=False):
+def print_results(results):
     """
     Get a list of flight results (List of dictionary-like objects from SQLAachemy).
     Even if there is one result, it should be provided in a list.
@@ -243,31 +235,28 @@ def print_results(results, filter_delay_only=False):
     FLIGHT_ID, ORIGIN_AIRPORT, DESTINATION_AIRPORT, AIRLINE, and DELAY.
     """
     print(f"Got {len(results)} results.")
-    for result in results:
-        # turn result into dictionary
-        result = result._mapping
+    if not results:
+        return
 
-        # Check that all required columns are in place
-        try:
-            """if result['DELAY'] is None or int(result['DELAY']) <= 0:
-                continue"""
-            delay = int(result['DELAY'])  if result['DELAY'] is not None else 0   # If delay columns is NULL, set it to 0
-            origin = result['ORIGIN_AIRPORT']
-            dest = result['DESTINATION_AIRPORT']
-            airline = result['AIRLINE']
-
-            if filter_delay_only and delay <= 0:
-                continue
-
-        except (ValueError, sqlalchemy.exc.SQLAlchemyError) as e:
-            print("Error showing results: ", e)
-            return
-
-        # Different prints for delayed and non-delayed flights
-        if delay > 0:
-            print(f"{result['ID']}. {origin} -> {dest} by {airline}, Delay: {delay} Minutes")
-        else:
-            print(f"{result['ID']}. {origin} -> {dest} by {airline}")
+    # Check that all required columns are in place
+    try:
+        # If delay columns is NULL, set it to 0
+        delays = np.fromiter((0 if row['DELAY'] is None else row['DELAY'] for row in results),
+                             dtype=np.int32, count=len(results))
+
+        # Different lines for delayed and non-delayed flights
+        lines = [
+            '%s. %s -> %s by %s, Delay: %d Minutes' % (row['ID'], row['ORIGIN_AIRPORT'],
+                                                       row['DESTINATION_AIRPORT'], row['AIRLINE'], delay)
+            if delay > 0 else
+            '%s. %s -> %s by %s' % (row['ID'], row['ORIGIN_AIRPORT'], row['DESTINATION_AIRPORT'], row['AIRLINE'])
+            for row, delay in zip(results, delays.tolist())
+        ]
+    except (ValueError, KeyError, sqlalchemy.exc.SQLAlchemyError) as e:
+        print("Error showing results: ", e)
+        return
+
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 
 def show_menu_and_get_input():
@@ -276,9 +265,7 @@ def show_menu_and_get_input():
     If it's a valid option, return a pointer to the function to execute.
     Otherwise, keep asking the user for input.
     """
-    print("Menu:")
-    for key, value in FUNCTIONS.items():
-        print(f"{key}. {value[1]}")
+    print(MENU_BANNER)
 
     # Input loop
     while True:
@@ -304,6 +291,8 @@ FUNCTIONS = {   1: (flight_by_id, "Show flight by ID"),
                 9: (quit, "Exit")
              }
 
+MENU_BANNER = "Menu:\n" + "\n".join(f"{key}. {value[1]}" for key, value in FUNCTIONS.items())
+
 
 def main():
     # Create an instance of the Data Object using our SQLite URI